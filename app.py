@@ -5,8 +5,10 @@ import main_page
 import os
 from dotenv import load_dotenv
 import db_utils
+import storage
 
 db_utils.init_db()
+storage.start_background_sweeper()
 
 
 load_dotenv()
@@ -0,0 +1,295 @@
+# chunk_table.py
+
+"""
+Compact, array-backed storage for chunk texts and metadata.
+
+A LangChain ``InMemoryDocstore`` keeps one ``Document`` plus a metadata dict
+per chunk, i.e. several Python objects per chunk. ``ChunkTable`` instead holds
+parallel typed arrays (source id, page range, section id, start offset, text
+offset) over one UTF-8 blob, with source and section names interned once.
+``ChunkDocstore`` and ``IdentityIds`` plug the table into LangChain's FAISS
+store; Documents are only materialised for the chunks a search returns.
+
+A compacted store is read-only: ``ChunkDocstore`` is not addable, so
+``FAISS.add_documents`` and ``merge_from`` raise ``ValueError``. Notebooks are
+always rebuilt as a whole; to append anyway, ``expand_store`` first and
+``compact_store`` again afterwards.
+"""
+
+import os
+from array import array
+from collections.abc import Mapping
+
+# Metadata keys stored as columns; anything else goes to a sparse side dict.
+_COLUMNS = ("source", "page", "page_end", "section", "start_index")
+
+
+class ChunkView:
+    """
+    Lightweight view of one row of a ``ChunkTable``.
+    """
+    __slots__ = ("_table", "_i")
+
+    def __init__(self, table, i):
+        self._table = table
+        self._i = i
+
+    @property
+    def source(self):
+        return self._table.sources[self._table.source_ids[self._i]]
+
+    @property
+    def page(self):
+        return self._table.pages[self._i]
+
+    @property
+    def page_content(self):
+        return self._table.text(self._i)
+
+    @property
+    def metadata(self):
+        return self._table.metadata(self._i)
+
+    def to_document(self):
+        from langchain.docstore.document import Document
+        return Document(page_content=self.page_content, metadata=self.metadata)
+
+
+class ChunkTable:
+
+    def __init__(self):
+        self.sources = []
+        self._source_index = {}
+        self.sections = [""]
+        self._section_index = {"": 0}
+        self.source_ids = array("i")
+        self.pages = array("i")
+        self.page_ends = array("i")
+        self.section_ids = array("i")
+        self.starts = array("q")
+        self.text_offsets = array("q", [0])
+        self._extra = {}
+        self._blob = bytearray()
+
+    def __len__(self):
+        return len(self.pages)
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return ChunkView(self, i)
+
+    @staticmethod
+    def _intern(names, index, name):
+        nid = index.get(name)
+        if nid is None:
+            nid = index[name] = len(names)
+            names.append(name)
+        return nid
+
+    def append(self, text, metadata):
+        page = int(metadata.get("page", 0))
+        self.source_ids.append(self._intern(self.sources, self._source_index, metadata.get("source", "")))
+        self.pages.append(page)
+        self.page_ends.append(int(metadata.get("page_end", page)))
+        self.section_ids.append(self._intern(self.sections, self._section_index, metadata.get("section") or ""))
+        self.starts.append(int(metadata.get("start_index", -1)))
+        extra = {k: v for k, v in metadata.items() if k not in _COLUMNS}
+        if extra:
+            self._extra[len(self.pages) - 1] = extra
+        self._blob += text.encode("utf-8")
+        self.text_offsets.append(len(self._blob))
+        return len(self.pages) - 1
+
+    def text(self, i):
+        return self._blob[self.text_offsets[i]:self.text_offsets[i + 1]].decode("utf-8")
+
+    def metadata(self, i):
+        meta = {"source": self.source(i), "page": self.pages[i]}
+        if self.page_ends[i] != self.pages[i]:
+            meta["page_end"] = self.page_ends[i]
+        if self.section_ids[i]:
+            meta["section"] = self.sections[self.section_ids[i]]
+        if self.starts[i] >= 0:
+            meta["start_index"] = self.starts[i]
+        meta.update(self._extra.get(i, {}))
+        return meta
+
+    def source(self, i):
+        return self.sources[self.source_ids[i]]
+
+    @classmethod
+    def from_documents(cls, docs):
+        table = cls()
+        for d in docs:
+            table.append(d.page_content, d.metadata)
+        return table
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_source_index"]
+        del state["_section_index"]
+        state["_blob"] = bytes(self._blob)
+        return state
+
+    def __setstate__(self, state):
+        state["_blob"] = bytearray(state["_blob"])
+        state["_source_index"] = {s: i for i, s in enumerate(state["sources"])}
+        state["_section_index"] = {s: i for i, s in enumerate(state["sections"])}
+        self.__dict__.update(state)
+
+
+class ChunkDocstore:
+    """
+    Read-only docstore over a ``ChunkTable`` whose ids are the row numbers
+    as strings.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def search(self, search):
+        try:
+            return self.table[int(search)].to_document()
+        except (ValueError, IndexError):
+            return f"ID {search} not found."
+
+    def __len__(self):
+        return len(self.table)
+
+
+class IdentityIds(Mapping):
+    """
+    ``index_to_docstore_id`` for a ``ChunkDocstore``: FAISS row ``i`` maps to
+    docstore id ``str(i)`` without storing a dict entry per chunk.
+    """
+
+    def __init__(self, docstore):
+        self._docstore = docstore
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self._docstore):
+            raise KeyError(i)
+        return str(i)
+
+    def __len__(self):
+        return len(self._docstore)
+
+    def __iter__(self):
+        return iter(range(len(self)))
+
+
+def compact_store(store):
+    """
+    Replace a LangChain FAISS store's docstore with a ``ChunkDocstore``, in
+    FAISS row order. Returns the store.
+    """
+    table = ChunkTable()
+    for i in range(store.index.ntotal):
+        doc = store.docstore.search(store.index_to_docstore_id[i])
+        table.append(doc.page_content, doc.metadata)
+    store.docstore = ChunkDocstore(table)
+    store.index_to_docstore_id = IdentityIds(store.docstore)
+    return store
+
+
+def expand_store(store):
+    """
+    Inverse of ``compact_store``: give a store back a regular
+    ``InMemoryDocstore`` so it can be appended to or merged. Returns the store.
+    """
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    docs = {str(i): store.docstore.search(store.index_to_docstore_id[i]) for i in range(store.index.ntotal)}
+    store.docstore = InMemoryDocstore(docs)
+    store.index_to_docstore_id = {i: str(i) for i in range(store.index.ntotal)}
+    return store
+
+
+def page_ranges(pages):
+    """
+    Collapse page numbers into ranges: [3, 4, 5, 7] -> "3–5, 7".
+    """
+    pages = sorted(set(pages))
+    parts = []
+    i = 0
+    while i < len(pages):
+        j = i
+        while j + 1 < len(pages) and pages[j + 1] == pages[j] + 1:
+            j += 1
+        parts.append(str(pages[i]) if i == j else f"{pages[i]}–{pages[j]}")
+        i = j + 1
+    return ", ".join(parts)
+
+
+def format_citations(docs):
+    """
+    One citation per source with its pages grouped into ranges, e.g.
+    "[Source: paper.pdf, Pages: 3–7, 9]".
+    """
+    by_source = {}
+    for d in docs:
+        page = d.metadata["page"]
+        by_source.setdefault(d.metadata["source"], set()).update(
+            range(page, d.metadata.get("page_end", page) + 1)
+        )
+    cites = []
+    for source in sorted(by_source):
+        pages = by_source[source]
+        label = "Page" if len(pages) == 1 else "Pages"
+        cites.append(f"[Source: {source}, {label}: {page_ranges(pages)}]")
+    return " ".join(cites)
+
+
+def _rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _measure(kind, n, chunk_chars, queue):
+    import gc
+    gc.collect()
+    before = _rss_bytes()
+    text = "x" * chunk_chars
+    if kind == "table":
+        store = ChunkTable()
+        for i in range(n):
+            store.append(text + str(i), {"source": f"paper{i % 50}.pdf", "page": i % 400 + 1, "start_index": 0})
+    else:
+        try:
+            from langchain.docstore.document import Document
+        except ImportError:
+            Document = None
+        store = {}
+        for i in range(n):
+            meta = {"source": f"paper{i % 50}.pdf", "page": i % 400 + 1, "start_index": 0}
+            content = text + str(i)
+            store[str(i)] = Document(page_content=content, metadata=meta) if Document else (content, meta)
+        ids = {i: str(i) for i in range(n)}
+    gc.collect()
+    queue.put(_rss_bytes() - before)
+
+
+def benchmark(n=1_000_000, chunk_chars=200):
+    """
+    RSS growth in bytes for holding ``n`` chunks as Documents in a dict vs. in
+    a ``ChunkTable``. Each variant is measured in a fresh forked process.
+    """
+    import multiprocessing as mp
+    ctx = mp.get_context("fork")
+    results = {}
+    for kind in ("documents", "table"):
+        queue = ctx.Queue()
+        p = ctx.Process(target=_measure, args=(kind, n, chunk_chars, queue))
+        p.start()
+        results[kind] = queue.get()
+        p.join()
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    res = benchmark(n)
+    mb = {k: v / 2**20 for k, v in res.items()}
+    print(f"{n} chunks: documents {mb['documents']:.0f} MB, table {mb['table']:.0f} MB "
+          f"({mb['documents'] / max(mb['table'], 1e-9):.1f}x smaller)")
@@ -30,6 +30,18 @@ def init_db():
         FOREIGN KEY(notebook_id) REFERENCES notebooks(id)
     )
     """)
+    # Artifacts: on-disk FAISS indexes and uploads owned by a notebook
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS artifacts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        notebook_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        path TEXT NOT NULL UNIQUE,
+        size_bytes INTEGER DEFAULT 0,
+        last_used REAL,
+        FOREIGN KEY(notebook_id) REFERENCES notebooks(id)
+    )
+    """)
     conn.commit()
     conn.close()
 
@@ -54,15 +66,24 @@ def create_notebook(user, name):
     conn.close()
 
 
-def delete_notebook(user, name):
-    conn = get_connection()
+def delete_notebook(user, name, conn=None):
+    # Removes the notebook with its notes and artifact rows in one transaction.
+    # Pass ``conn`` to take part in a caller's transaction (commit is left to it).
+    own = conn is None
+    conn = conn or get_connection()
     cur = conn.cursor()
     cur.execute(
-        "DELETE FROM notebooks WHERE user = ? AND name = ?",
+        "SELECT id FROM notebooks WHERE user = ? AND name = ?",
         (user, name)
     )
-    conn.commit()
-    conn.close()
+    row = cur.fetchone()
+    if row:
+        cur.execute("DELETE FROM notes WHERE notebook_id = ?", (row["id"],))
+        cur.execute("DELETE FROM artifacts WHERE notebook_id = ?", (row["id"],))
+        cur.execute("DELETE FROM notebooks WHERE id = ?", (row["id"],))
+    if own:
+        conn.commit()
+        conn.close()
 
 
 def update_notebook_processing(notebook_id, processed, faiss_path):
@@ -98,3 +119,65 @@ def get_notes_from_db(notebook_id):
     conn.close()
     return [r["content"] for r in rows]
 
+
+
+def add_artifact(notebook_id, kind, path, size_bytes, last_used=None):
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        "INSERT OR REPLACE INTO artifacts (notebook_id, kind, path, size_bytes, last_used) VALUES (?,?,?,?,?)",
+        (notebook_id, kind, path, int(size_bytes), last_used)
+    )
+    conn.commit()
+    conn.close()
+
+
+def get_artifacts(notebook_id=None, user=None, kind=None):
+    conn = get_connection()
+    cur = conn.cursor()
+    query = (
+        "SELECT a.id, a.notebook_id, a.kind, a.path, a.size_bytes, a.last_used, n.user, n.name "
+        "FROM artifacts a JOIN notebooks n ON n.id = a.notebook_id WHERE 1=1"
+    )
+    params = []
+    if notebook_id is not None:
+        query += " AND a.notebook_id = ?"
+        params.append(notebook_id)
+    if user is not None:
+        query += " AND n.user = ?"
+        params.append(user)
+    if kind is not None:
+        query += " AND a.kind = ?"
+        params.append(kind)
+    cur.execute(query, params)
+    rows = cur.fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+
+def touch_artifact(path, last_used):
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        "UPDATE artifacts SET last_used = ? WHERE path = ?",
+        (last_used, path)
+    )
+    conn.commit()
+    conn.close()
+
+
+def delete_artifact(path):
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM artifacts WHERE path = ?", (path,))
+    conn.commit()
+    conn.close()
+
+
+def get_all_notebooks():
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT id, user, name, processed, faiss_path FROM notebooks")
+    rows = cur.fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
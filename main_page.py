@@ -1,9 +1,8 @@
 # main_page.py
 
 import streamlit as st
-from PyPDF2 import PdfReader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-import os, hashlib
+import os
+from multiprocessing import AuthenticationError
 import google.generativeai as genai
 from google.api_core.exceptions import ResourceExhausted
 from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
@@ -13,7 +12,14 @@ from langchain.chains.summarize import load_summarize_chain
 from langchain.prompts import PromptTemplate
 from langchain.docstore.document import Document
 
+import chunk_table
+import chunking
 import db_utils
+import notebook_archive
+import pdf_extract
+import rerank
+import retrieval_service
+import storage
 
 # Configure Google Generative AI
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
@@ -22,10 +28,12 @@ GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
 
 def get_pdf_text_with_metadata(pdf_docs):
     docs = []
+    backend = pdf_extract.get_backend()
+    backends = pdf_extract.available_backends()
+    cache = pdf_extract.PageCache()
     for pdf in pdf_docs:
-        reader = PdfReader(pdf)
-        for i, page in enumerate(reader.pages):
-            text = page.extract_text() or ""
+        pages = pdf_extract.extract_pages(pdf.getvalue(), backend, cache, backends)
+        for i, text in enumerate(pages):
             docs.append(Document(
                 page_content=text,
                 metadata={"source": pdf.name, "page": i+1}
@@ -34,8 +42,7 @@ def get_pdf_text_with_metadata(pdf_docs):
 
 
 def get_text_chunks(documents):
-    splitter = RecursiveCharacterTextSplitter(chunk_size=10000, chunk_overlap=1000)
-    return splitter.split_documents(documents)
+    return chunking.chunk_documents(documents)
 
 
 def get_vector_store(chunks, index_name):
@@ -45,11 +52,21 @@ def get_vector_store(chunks, index_name):
     try:
         embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
         store = FAISS.from_documents(chunks, embedding=embeddings)
+        chunk_table.compact_store(store)
         store.save_local(index_name)
 
         # Persist processing status to DB
         nb_id = st.session_state.current_notebook_id
         db_utils.update_notebook_processing(nb_id, True, index_name)
+        storage.register_index(nb_id, index_name)
+        # Never evict the index we just built, or the notebook would need rebuilding again
+        storage.enforce_quota(st.session_state.user, exclude_notebook_id=nb_id)
+        used = storage.usage_bytes(st.session_state.user)
+        if used > storage.USER_QUOTA_BYTES:
+            st.warning(
+                f"You are using {used / 2**20:.0f} MB of your {storage.USER_QUOTA_BYTES / 2**20:.0f} MB "
+                "storage quota. Delete notebooks or exports to free space."
+            )
 
         st.session_state.faiss_index_path = index_name
         st.session_state.processing_done = True
@@ -61,6 +78,22 @@ def get_vector_store(chunks, index_name):
         return False
 
 
+def export_notebook(nb, index_path, dtype):
+    try:
+        store = retrieval_service.load_index(index_path)
+        notes = db_utils.get_notes_from_db(st.session_state.current_notebook_id)
+        nb_id = st.session_state.current_notebook_id
+        out_dir = storage.notebook_dir(st.session_state.user, nb_id)
+        os.makedirs(out_dir, exist_ok=True)
+        out_path = os.path.join(out_dir, f"notebook_{nb_id}.psnb")
+        notebook_archive.export_notebook(store, notes, out_path, nb, dtype)
+        # Owned by the notebook so it counts toward quota and is deleted with it
+        db_utils.add_artifact(nb_id, "export", out_path, os.path.getsize(out_path))
+        st.session_state[f"export_path_{nb}"] = out_path
+    except Exception as e:
+        st.error(f"Error exporting notebook: {e}")
+
+
 def get_conversational_chain():
     template = """
 Answer the question as detailed as possible from the provided context.
@@ -78,13 +111,29 @@ Answer:
     return load_qa_chain(model, chain_type="stuff", prompt=prompt)
 
 
+def search_index(index_path, question, k=5):
+    # Prefer the shared retrieval service so indexes are not loaded per session
+    if retrieval_service.SOCKET_PATH:
+        try:
+            return retrieval_service.RetrievalClient().similarity_search(index_path, question, k)
+        except (OSError, EOFError, AuthenticationError):
+            # Service unreachable or misconfigured: search in-process instead
+            pass
+    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+    db = FAISS.load_local(index_path, embeddings, allow_dangerous_deserialization=True)
+    return rerank.retrieve(db, question, k=k)
+
+
 def user_input(user_question, index_path):
     if not index_path or not os.path.exists(index_path):
         st.error("🔴 No FAISS index found. Process PDFs first.")
         return
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-    db = FAISS.load_local(index_path, embeddings, allow_dangerous_deserialization=True)
-    docs = db.similarity_search(user_question, k=5)
+    storage.touch(index_path)
+    try:
+        docs = search_index(index_path, user_question, k=5)
+    except Exception as e:
+        st.error(f"Error searching the index: {e}")
+        return
     if not docs:
         st.warning("No relevant info found.")
         st.session_state.chat_history += [("User", user_question), ("PaperSage", "No info found.")]
@@ -95,11 +144,7 @@ def user_input(user_question, index_path):
     answer = result.get("output_text", "")
 
     # Build citations
-    cites = {
-        f"[Source: {d.metadata['source']}, Page: {d.metadata['page']}]"
-        for d in docs
-    }
-    cite_str = " ".join(sorted(cites))
+    cite_str = chunk_table.format_citations(docs)
 
     st.session_state.chat_history += [
         ("User", user_question),
@@ -123,7 +168,7 @@ def main_notebook_page():
     # Fetch notebook record from DB
     recs = db_utils.get_notebooks(user)
     rec = next((r for r in recs if r["id"] == st.session_state.current_notebook_id), None)
-    idx_path = rec["faiss_path"] if rec and rec["faiss_path"] else f"faiss_index_{hashlib.md5(nb.encode()).hexdigest()}"
+    idx_path = rec["faiss_path"] if rec and rec["faiss_path"] else storage.default_index_path(nb)
 
     # Initialize session state for this notebook on first load
     if st.session_state.get("current_notebook_init") != nb:
@@ -136,6 +181,13 @@ def main_notebook_page():
     st.sidebar.header(f"Notebook: {nb}")
     files = st.sidebar.file_uploader("Upload PDF(s)", accept_multiple_files=True, key=f"upload_{nb}")
     if st.sidebar.button("Process PDFs", key=f"process_{nb}"):
+        nb_id = st.session_state.current_notebook_id
+        if files:
+            # Replaces earlier uploads: the index always covers exactly these files
+            storage.save_uploads(user, nb_id, files)
+        else:
+            # Rebuild from stored uploads, e.g. after the index was evicted
+            files = storage.stored_uploads(nb_id)
         if files:
             with st.spinner("Processing PDFs..."):
                 raw = get_pdf_text_with_metadata(files)
@@ -144,6 +196,16 @@ def main_notebook_page():
         else:
             st.sidebar.warning("Please upload PDFs first.")
     st.sidebar.markdown("---")
+    if st.session_state.processing_done:
+        compact = st.sidebar.checkbox("Compact export (float16)", key=f"compact_{nb}")
+        if st.sidebar.button("Prepare export", key=f"export_{nb}"):
+            with st.spinner("Exporting notebook..."):
+                export_notebook(nb, st.session_state.faiss_index_path, "float16" if compact else "float32")
+        archive_path = st.session_state.get(f"export_path_{nb}")
+        if archive_path and os.path.exists(archive_path):
+            with open(archive_path, "rb") as f:
+                st.sidebar.download_button("Download archive", f, file_name=f"{nb}.psnb", key=f"download_{nb}")
+        st.sidebar.markdown("---")
     if st.sidebar.button("Back to Notebooks", key=f"back_{nb}"):
         st.session_state.page = "notebook"
         st.session_state.current_notebook = None
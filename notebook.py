@@ -1,5 +1,10 @@
+import os
+import tempfile
+
 import streamlit as st
 import db_utils
+import notebook_archive
+import storage
 
 
 def notebook_management():
@@ -24,6 +29,29 @@ def notebook_management():
             st.error("Please enter a notebook name.")
 
 
+    st.subheader("Import a Notebook")
+    archive = st.file_uploader("Notebook archive (.psnb)", type=["psnb"], key="import_archive")
+    import_name = st.text_input("Name (optional)", key="import_nb_name")
+    if st.button("Import Notebook"):
+        if archive:
+            # Spool to disk so the archive can be memory-mapped
+            with tempfile.NamedTemporaryFile(suffix=".psnb", delete=False) as tmp:
+                tmp.write(archive.getbuffer())
+            try:
+                with st.spinner("Importing notebook..."):
+                    name = notebook_archive.import_notebook(tmp.name, st.session_state.user, import_name or None)
+                st.success(f"Notebook '{name}' imported!")
+                st.rerun()
+            except ValueError as e:
+                st.warning(str(e))
+            except Exception as e:
+                st.error(f"Error importing notebook: {e}")
+            finally:
+                os.remove(tmp.name)
+        else:
+            st.error("Please choose an archive to import.")
+
+
     st.subheader("Existing Notebooks")
     user = st.session_state.user
     notebooks = db_utils.get_notebooks(user)
@@ -47,7 +75,7 @@ def notebook_management():
             with col2:
                 if st.button("Delete", key=f"delete_{nb_name}"):
                     
-                    db_utils.delete_notebook(user, nb_name)
+                    storage.delete_notebook(user, nb_name)
                     st.success(f"Notebook '{nb_name}' deleted!")
                     
                     if st.session_state.current_notebook == nb_name:
@@ -0,0 +1,232 @@
+# notebook_archive.py
+
+"""
+Single-file notebook archive (``.psnb``) for moving processed notebooks
+between machines without re-embedding.
+
+Layout (sections 64-byte aligned, footer offsets absolute):
+
+    MAGIC
+    vectors        n x dim array of float16/float32, little-endian
+    texts          concatenated UTF-8 chunk texts
+    metadata       JSON array, one dict per chunk
+    text_offsets   n + 1 int64 offsets, relative to the texts section
+    footer         JSON: config, notes, section offsets
+    footer length  uint64, then MAGIC again
+
+Sections are written as they are produced, so export never holds the whole
+notebook in memory, and the footer comes last so it can describe them. On
+import the vector and text sections are memory-mapped.
+"""
+
+import json
+import os
+import shutil
+import struct
+
+import numpy as np
+
+import chunk_table
+import db_utils
+import retrieval_service
+import storage
+
+MAGIC = b"PSNBARC1"
+VERSION = 1
+ALIGN = 64
+BATCH = 4096
+
+
+def _pad(f):
+    pos = f.tell()
+    if pos % ALIGN:
+        f.write(b"\0" * (ALIGN - pos % ALIGN))
+    return f.tell()
+
+
+def export_notebook(store, notes, out_path, name, dtype="float32"):
+    """
+    Stream a LangChain FAISS ``store`` and its ``notes`` into ``out_path``.
+    """
+    index = store.index
+    n, dim = index.ntotal, index.d
+    dtype = np.dtype(dtype).newbyteorder("<")
+    sections = {}
+
+    with open(out_path, "wb") as f:
+        f.write(MAGIC)
+
+        start = _pad(f)
+        for i in range(0, n, BATCH):
+            batch = index.reconstruct_n(i, min(BATCH, n - i))
+            f.write(np.ascontiguousarray(batch, dtype=dtype).tobytes())
+        sections["vectors"] = [start, f.tell() - start]
+
+        offsets = np.zeros(n + 1, dtype="<i8")
+        start = _pad(f)
+        for i in range(n):
+            doc = store.docstore.search(store.index_to_docstore_id[i])
+            f.write(doc.page_content.encode("utf-8"))
+            offsets[i + 1] = f.tell() - start
+        sections["texts"] = [start, f.tell() - start]
+
+        start = _pad(f)
+        f.write(b"[")
+        for i in range(n):
+            doc = store.docstore.search(store.index_to_docstore_id[i])
+            if i:
+                f.write(b",")
+            f.write(json.dumps(doc.metadata, ensure_ascii=False).encode("utf-8"))
+        f.write(b"]")
+        sections["metadata"] = [start, f.tell() - start]
+
+        # Offsets are only known once the texts are written, so they follow them
+        start = _pad(f)
+        f.write(offsets.tobytes())
+        sections["text_offsets"] = [start, f.tell() - start]
+
+        footer = {
+            "version": VERSION,
+            "name": name,
+            "config": {
+                "count": n,
+                "dim": dim,
+                "dtype": dtype.name,
+                "metric_type": int(index.metric_type),
+                "index_type": type(index).__name__,
+                "normalize_L2": bool(getattr(store, "_normalize_L2", False)),
+                "distance_strategy": str(getattr(store.distance_strategy, "value", store.distance_strategy)),
+                "embedding_model": retrieval_service.EMBEDDING_MODEL,
+            },
+            "notes": list(notes),
+            "sections": sections,
+        }
+        data = json.dumps(footer, ensure_ascii=False).encode("utf-8")
+        f.write(data)
+        f.write(struct.pack("<Q", len(data)))
+        f.write(MAGIC)
+    return out_path
+
+
+class NotebookArchive:
+    """
+    Read-only view of a ``.psnb`` file. ``vectors`` is a memmap.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # Callers only handle ValueError, so report any unreadable file as one
+        try:
+            footer = self._read_footer(path)
+            if footer.get("version") != VERSION:
+                raise ValueError(f"Unsupported archive version: {footer.get('version')}")
+            self.name = footer["name"]
+            self.config = footer["config"]
+            self.notes = footer["notes"]
+            self._sections = footer["sections"]
+
+            n, dim = self.config["count"], self.config["dim"]
+            self.vectors = self._map("vectors", np.dtype(self.config["dtype"]).newbyteorder("<"), (n, dim))
+            self._offsets = self._map("text_offsets", np.dtype("<i8"), (n + 1,))
+            self._texts = self._map("texts", np.uint8, None)
+        except ValueError:
+            raise
+        except (OSError, KeyError, TypeError, AttributeError, struct.error) as e:
+            raise ValueError(f"{path} is truncated or corrupt: {e}") from e
+
+    @staticmethod
+    def _read_footer(path):
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a PaperSage notebook archive.")
+            if f.seek(0, os.SEEK_END) < 2 * len(MAGIC) + 8:
+                raise ValueError(f"{path} is truncated or corrupt.")
+            f.seek(-(8 + len(MAGIC)), os.SEEK_END)
+            (length,) = struct.unpack("<Q", f.read(8))
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is truncated or corrupt.")
+            f.seek(-(8 + len(MAGIC) + length), os.SEEK_END)
+            footer = json.loads(f.read(length).decode("utf-8"))
+        if not isinstance(footer, dict):
+            raise ValueError(f"{path} is truncated or corrupt.")
+        return footer
+
+    def _map(self, key, dtype, shape):
+        offset, nbytes = self._sections[key]
+        if nbytes == 0:
+            return np.zeros(shape or (0,), dtype=dtype)
+        return np.memmap(self.path, dtype=dtype, mode="r", offset=offset, shape=shape)
+
+    def __len__(self):
+        return self.config["count"]
+
+    def text(self, i):
+        return bytes(self._texts[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8")
+
+    def metadata(self):
+        offset, nbytes = self._sections["metadata"]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.read(nbytes).decode("utf-8"))
+
+
+def build_store(archive):
+    """
+    Rebuild a LangChain FAISS store from an archive, without embedding calls.
+    """
+    import faiss
+    from langchain_community.vectorstores import FAISS
+    from langchain_community.vectorstores.utils import DistanceStrategy
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    cfg = archive.config
+    index = faiss.IndexFlat(cfg["dim"], cfg["metric_type"])
+    for i in range(0, len(archive), BATCH):
+        index.add(np.ascontiguousarray(archive.vectors[i:i + BATCH], dtype=np.float32))
+
+    table = chunk_table.ChunkTable()
+    for i, meta in enumerate(archive.metadata()):
+        table.append(archive.text(i), meta)
+    docstore = chunk_table.ChunkDocstore(table)
+    return FAISS(
+        GoogleGenerativeAIEmbeddings(model=cfg["embedding_model"]),
+        index,
+        docstore,
+        chunk_table.IdentityIds(docstore),
+        normalize_L2=cfg["normalize_L2"],
+        distance_strategy=DistanceStrategy(cfg["distance_strategy"]),
+    )
+
+
+def import_notebook(path, user, name=None):
+    """
+    Create a processed notebook for ``user`` from the archive at ``path``.
+    Returns the new notebook's name.
+
+    The index is built before the notebook row exists; if anything fails,
+    the index directory and any rows written so far are removed again.
+    """
+    archive = NotebookArchive(path)
+    name = name or archive.name
+    if any(nb["name"] == name for nb in db_utils.get_all_notebooks()):
+        raise ValueError(f"Notebook '{name}' already exists.")
+
+    index_path = storage.default_index_path(name)
+    nb = None
+    try:
+        build_store(archive).save_local(index_path)
+        db_utils.create_notebook(user, name)
+        nb = next((n for n in db_utils.get_notebooks(user) if n["name"] == name), None)
+        if nb is None:
+            # Another user created the name in the meantime
+            raise ValueError(f"Notebook '{name}' already exists.")
+        db_utils.update_notebook_processing(nb["id"], True, index_path)
+        storage.register_index(nb["id"], index_path)
+        for note in archive.notes:
+            db_utils.add_note_to_db(nb["id"], note)
+    except Exception:
+        if nb is not None:
+            db_utils.delete_notebook(user, name)
+        shutil.rmtree(index_path, ignore_errors=True)
+        raise
+    return name
@@ -0,0 +1,333 @@
+# pdf_extract.py
+
+import hashlib
+import io
+import logging
+import os
+import re
+import sqlite3
+import time
+
+EXTRACT_CACHE_PATH = os.getenv("PAPERSAGE_EXTRACT_CACHE", "extract_cache.db")
+# Bump whenever extraction output changes, so cached text from older
+# extractors is not reused.
+EXTRACT_VERSION = 2
+
+logger = logging.getLogger(__name__)
+
+
+class PyMuPDFBackend:
+    """
+    Layout-aware extraction using PyMuPDF. Much faster than PyPDF2 on dense,
+    multi-column papers.
+    """
+    name = "pymupdf"
+
+    def __init__(self):
+        try:
+            import pymupdf
+        except ImportError:
+            import fitz as pymupdf
+        self._pymupdf = pymupdf
+
+    def pages(self, data):
+        """
+        Return one entry per page: its text, or None if the page failed.
+        Raises if the file cannot be opened at all.
+        """
+        texts = []
+        with self._pymupdf.open(stream=data, filetype="pdf") as doc:
+            for page in doc:
+                try:
+                    # Keep PyMuPDF's native block order: it follows the content
+                    # stream, which reads two-column papers column by column.
+                    # sort=True orders by line position and interleaves columns.
+                    texts.append(page.get_text("text") or "")
+                except Exception as e:
+                    logger.warning("pymupdf failed on page %d: %s", page.number + 1, e)
+                    texts.append(None)
+        return texts
+
+
+class PyPDF2Backend:
+    """
+    Fallback extraction using PyPDF2, which is always installed.
+    """
+    name = "pypdf2"
+
+    def __init__(self):
+        from PyPDF2 import PdfReader
+        self._reader_cls = PdfReader
+
+    def pages(self, data):
+        reader = self._reader_cls(io.BytesIO(data))
+        texts = []
+        for i, page in enumerate(reader.pages):
+            try:
+                texts.append(page.extract_text() or "")
+            except Exception as e:
+                logger.warning("pypdf2 failed on page %d: %s", i + 1, e)
+                texts.append(None)
+        return texts
+
+
+# Tried in order: the first one that imports is the primary backend, the
+# rest are fallbacks for files or pages it cannot read.
+BACKENDS = [PyMuPDFBackend, PyPDF2Backend]
+
+
+def available_backends():
+    backends = []
+    for cls in BACKENDS:
+        try:
+            backends.append(cls())
+        except ImportError:
+            continue
+    return backends
+
+
+def get_backend(name=None):
+    """
+    Return an instance of the requested backend, or of the first
+    available one. ``PAPERSAGE_PDF_BACKEND`` overrides the default.
+    """
+    name = name or os.getenv("PAPERSAGE_PDF_BACKEND")
+    for cls in BACKENDS:
+        if name and cls.name != name:
+            continue
+        try:
+            return cls()
+        except ImportError:
+            continue
+    raise RuntimeError(f"No PDF extraction backend available (requested: {name or 'any'}).")
+
+
+def file_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_key(data):
+    return f"{file_hash(data)}-v{EXTRACT_VERSION}"
+
+
+class PageCache:
+    """
+    On-disk cache of extracted page text keyed by (file hash, page).
+    Pages that produced no text are not stored as text; instead the backends
+    that tried them are recorded, so they are not asked again.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or EXTRACT_CACHE_PATH
+        conn = self._connect()
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS extracted_pages (
+            file_hash TEXT NOT NULL,
+            page INTEGER NOT NULL,
+            backend TEXT NOT NULL,
+            text TEXT NOT NULL,
+            PRIMARY KEY (file_hash, page)
+        )
+        """)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS extracted_files (
+            file_hash TEXT PRIMARY KEY,
+            page_count INTEGER NOT NULL
+        )
+        """)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS failed_pages (
+            file_hash TEXT NOT NULL,
+            page INTEGER NOT NULL,
+            backend TEXT NOT NULL,
+            PRIMARY KEY (file_hash, page, backend)
+        )
+        """)
+        # Drop rows written by older extractor versions
+        suffix = f"%-v{EXTRACT_VERSION}"
+        for table in ("extracted_pages", "extracted_files", "failed_pages"):
+            conn.execute(f"DELETE FROM {table} WHERE file_hash NOT LIKE ?", (suffix,))
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path)
+
+    def get(self, digest):
+        """
+        Return ``(page_count, {page_no: text})``; page_count is None if the
+        file has never been extracted.
+        """
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT page_count FROM extracted_files WHERE file_hash = ?", (digest,)
+        ).fetchone()
+        rows = conn.execute(
+            "SELECT page, text FROM extracted_pages WHERE file_hash = ?", (digest,)
+        ).fetchall()
+        conn.close()
+        return (row[0] if row else None), dict(rows)
+
+    def tried(self, digest):
+        """
+        Return ``{page_no: {backend, ...}}`` for pages backends found no text on.
+        """
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT page, backend FROM failed_pages WHERE file_hash = ?", (digest,)
+        ).fetchall()
+        conn.close()
+        tried = {}
+        for page, backend in rows:
+            tried.setdefault(page, set()).add(backend)
+        return tried
+
+    def put(self, digest, page_count, pages, failed=None):
+        """
+        Store ``pages`` as ``{page_no: (backend, text)}`` and ``failed`` as
+        ``{page_no: [backend, ...]}``.
+        """
+        conn = self._connect()
+        conn.executemany(
+            "INSERT OR IGNORE INTO failed_pages (file_hash, page, backend) VALUES (?,?,?)",
+            [(digest, page, b) for page, names in (failed or {}).items() for b in names]
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO extracted_files (file_hash, page_count) VALUES (?,?)",
+            (digest, page_count)
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO extracted_pages (file_hash, page, backend, text) VALUES (?,?,?,?)",
+            [(digest, page, backend, text) for page, (backend, text) in pages.items()]
+        )
+        conn.commit()
+        conn.close()
+
+
+def _extract(data, backend):
+    try:
+        return backend.pages(data)
+    except Exception as e:
+        logger.warning("%s could not open PDF: %s", backend.name, e)
+        return None
+
+
+def extract_pages(data, backend=None, cache=None, backends=None):
+    """
+    Return the text of every page in the PDF bytes ``data``.
+
+    The primary backend is tried first; pages it fails on or returns empty are
+    retried with the remaining backends. Each page is parsed at most once per
+    backend: text is cached, and so is which backends found none.
+    """
+    backends = list(backends) if backends is not None else available_backends()
+    if backend is not None:
+        backends = [backend] + [b for b in backends if b.name != backend.name]
+    if not backends:
+        raise RuntimeError("No PDF extraction backend available.")
+    cache = cache if cache is not None else PageCache()
+    digest = cache_key(data)
+
+    page_count, cached = cache.get(digest)
+    tried = cache.tried(digest)
+    found, failed = {}, {}
+
+    def wanted(b):
+        return [
+            p for p in range(1, page_count + 1)
+            if p not in cached and p not in found and b.name not in tried.get(p, ())
+        ]
+
+    for b in backends:
+        pages = None if page_count is None else wanted(b)
+        if pages == []:
+            continue
+        texts = _extract(data, b)
+        if texts is not None and page_count is None:
+            page_count = len(texts)
+            pages = wanted(b)
+        elif texts is not None and len(texts) != page_count:
+            logger.warning("%s saw %d pages, expected %d; skipping", b.name, len(texts), page_count)
+            texts = None
+        for p in pages or []:
+            text = texts[p - 1] if texts is not None else None
+            if text and text.strip():
+                found[p] = (b.name, text)
+            else:
+                failed.setdefault(p, []).append(b.name)
+                tried.setdefault(p, set()).add(b.name)
+
+    if page_count is None:
+        raise ValueError("No backend could read this PDF.")
+    blank = [p for p in range(1, page_count + 1) if p not in cached and p not in found]
+    if failed:
+        logger.warning("No text extracted for page(s) %s of %s", blank, digest[:12])
+    if found or failed or not cached:
+        cache.put(digest, page_count, found, failed)
+    return [cached.get(p) or found.get(p, ("", ""))[1] for p in range(1, page_count + 1)]
+
+
+def _bigrams(text):
+    words = re.findall(r"\w+", (text or "").lower())
+    return set(zip(words, words[1:]))
+
+
+def reading_order_agreement(text, reference):
+    """
+    Share of the reference's word bigrams that also occur in ``text``.
+    Interleaved columns or scrambled lines break bigrams and lower the score.
+    """
+    ref = _bigrams(reference)
+    return len(_bigrams(text) & ref) / len(ref) if ref else 1.0
+
+
+def benchmark(paths, backends=None, reference="pypdf2"):
+    """
+    Time each available backend over ``paths`` (no cache) and return
+    ``{backend_name: (pages_per_second, agreement)}``, where agreement is the
+    mean per-page ``reading_order_agreement`` with the ``reference`` backend.
+    """
+    blobs = []
+    for p in paths:
+        with open(p, "rb") as f:
+            blobs.append(f.read())
+    runs = {}
+    for cls in backends or BACKENDS:
+        try:
+            backend = cls()
+        except ImportError:
+            continue
+        pages = []
+        start = time.perf_counter()
+        for data in blobs:
+            pages.append(backend.pages(data))
+        runs[backend.name] = (pages, time.perf_counter() - start)
+
+    ref_pages = runs.get(reference, (None,))[0]
+    results = {}
+    for name, (pages, elapsed) in runs.items():
+        n_pages = sum(len(p) for p in pages)
+        agreement = None
+        if ref_pages is not None:
+            scores = [
+                reading_order_agreement(t, r)
+                for doc, ref_doc in zip(pages, ref_pages) if len(doc) == len(ref_doc)
+                for t, r in zip(doc, ref_doc)
+            ]
+            agreement = sum(scores) / len(scores) if scores else None
+        results[name] = (n_pages / elapsed if elapsed else float("inf"), agreement)
+    return results
+
+
+if __name__ == "__main__":
+    import glob
+    import sys
+
+    root = sys.argv[1] if len(sys.argv) > 1 else "uploads"
+    files = glob.glob(os.path.join(root, "**", "*.pdf"), recursive=True)
+    if not files:
+        print(f"No PDFs found under {root}")
+        sys.exit(1)
+    for name, (pps, agreement) in benchmark(files).items():
+        quality = f"{agreement:.3f}" if agreement is not None else "n/a"
+        print(f"{name:10s} {pps:8.1f} pages/s  reading order vs pypdf2 {quality}  ({len(files)} file(s))")
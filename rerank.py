@@ -0,0 +1,166 @@
+# rerank.py
+
+import os
+import re
+import time
+
+import numpy as np
+
+FETCH_K = int(os.getenv("PAPERSAGE_FETCH_K", "50"))
+CROSS_ENCODER_MODEL = os.getenv("PAPERSAGE_CROSS_ENCODER")
+
+# Relevance = w_cos * cosine + w_terms * term overlap (+ w_cross * cross-encoder)
+WEIGHTS = {"cosine": 0.7, "terms": 0.3, "cross": 0.5}
+MMR_LAMBDA = 0.7
+
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "does", "for", "from", "how",
+    "in", "is", "it", "of", "on", "or", "that", "the", "this", "to", "was", "what",
+    "when", "where", "which", "who", "why", "with",
+}
+_cross_encoder = None
+
+
+def query_terms(question):
+    terms = re.findall(r"\w+", question.lower())
+    return sorted({t for t in terms if len(t) > 1 and t not in _STOPWORDS})
+
+
+def _normalize(x):
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def _minmax(x):
+    lo, hi = x.min(), x.max()
+    return (x - lo) / (hi - lo) if hi > lo else np.zeros_like(x)
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+def _has_word(text, term):
+    """
+    Whether ``term`` occurs in ``text`` as a whole ``\\w+`` word. Uses
+    ``str.find`` and checks the boundaries of each hit, which is far cheaper
+    than tokenizing the whole text on every query.
+    """
+    n = len(term)
+    i = text.find(term)
+    while i != -1:
+        if (i == 0 or not _is_word_char(text[i - 1])) and (i + n == len(text) or not _is_word_char(text[i + n])):
+            return True
+        i = text.find(term, i + 1)
+    return False
+
+
+def term_overlap(terms, texts):
+    """
+    IDF-weighted fraction of query terms present in each text as whole
+    words, computed over the candidate set.
+    """
+    if not terms:
+        return np.zeros(len(texts), dtype=np.float32)
+    lowered = [t.lower() for t in texts]
+    present = np.array([[_has_word(text, term) for term in terms] for text in lowered], dtype=np.float32)
+    df = present.sum(axis=0)
+    idf = np.log((len(texts) + 1) / (df + 1)) + 1.0
+    return (present @ idf) / idf.sum()
+
+
+def get_cross_encoder():
+    """
+    Return a ``(query, texts) -> scores`` callable backed by a local
+    sentence-transformers cross-encoder, or None if none is configured.
+    """
+    global _cross_encoder
+    if _cross_encoder is None and CROSS_ENCODER_MODEL:
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            return None
+        model = CrossEncoder(CROSS_ENCODER_MODEL)
+        _cross_encoder = lambda q, texts: np.asarray(model.predict([(q, t) for t in texts]), dtype=np.float32)
+    return _cross_encoder
+
+
+def rerank(query_vec, cand_vecs, texts, question, k=5, mmr_lambda=MMR_LAMBDA, cross_encoder=None):
+    """
+    Score candidates and pick ``k`` of them by maximal marginal relevance.
+    Returns the selected candidate positions, best first.
+    """
+    n = len(texts)
+    if n == 0:
+        return []
+    q = _normalize(np.asarray(query_vec, dtype=np.float32))
+    c = _normalize(np.asarray(cand_vecs, dtype=np.float32))
+
+    relevance = WEIGHTS["cosine"] * (c @ q) + WEIGHTS["terms"] * term_overlap(query_terms(question), texts)
+    if cross_encoder is not None:
+        relevance = relevance + WEIGHTS["cross"] * _minmax(cross_encoder(question, texts))
+
+    sim = c @ c.T
+    selected = []
+    max_sim = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    for _ in range(min(k, n)):
+        redundancy = np.where(np.isfinite(max_sim), max_sim, 0.0)
+        mmr = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+        mmr[~available] = -np.inf
+        best = int(np.argmax(mmr))
+        selected.append(best)
+        available[best] = False
+        max_sim = np.maximum(max_sim, sim[best])
+    return selected
+
+
+def retrieve(db, question, k=5, fetch_k=FETCH_K):
+    """
+    Over-fetch ``fetch_k`` neighbours from a LangChain FAISS store and
+    return the ``k`` best Documents after re-ranking.
+    """
+    query_vec = np.asarray(db.embedding_function.embed_query(question), dtype=np.float32)
+    fetch_k = min(fetch_k, db.index.ntotal)
+    if fetch_k == 0:
+        return []
+    _, ids = db.index.search(query_vec[None, :], fetch_k)
+    ids = ids[0][ids[0] != -1]
+    cand_vecs = db.index.reconstruct_batch(ids)
+    docs = [db.docstore.search(db.index_to_docstore_id[int(i)]) for i in ids]
+    order = rerank(query_vec, cand_vecs, [d.page_content for d in docs], question, k,
+                   cross_encoder=get_cross_encoder())
+    return [docs[i] for i in order]
+
+
+def benchmark(n_candidates=FETCH_K, dim=768, k=5, chunk_tokens=None, repeats=200, seed=0):
+    """
+    Return mean re-ranking cost in milliseconds per query on synthetic
+    candidates shaped like the app's (embedding-001 is 768-d, chunks of up
+    to ``chunking.MAX_TOKENS`` tokens).
+    """
+    import chunking
+    chunk_tokens = chunk_tokens or chunking.MAX_TOKENS
+    rng = np.random.default_rng(seed)
+    # Includes near-misses ("layered", "glosses") that a substring match would count
+    words = ["model", "attention", "retrieval", "dataset", "layer", "token", "loss", "graph",
+             "the", "of", "and", "results", "layered", "glosses", "training", "network"]
+    texts = []
+    for _ in range(n_candidates):
+        text = " ".join(rng.choice(words, chunk_tokens))
+        while chunking.count_tokens(text) > chunk_tokens:
+            text = text[:int(len(text) * 0.9)]
+        texts.append(text)
+    query_vec = rng.standard_normal(dim).astype(np.float32)
+    cand_vecs = rng.standard_normal((n_candidates, dim)).astype(np.float32)
+    question = "How does the attention layer affect retrieval loss?"
+    rerank(query_vec, cand_vecs, texts, question, k)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        rerank(query_vec, cand_vecs, texts, question, k)
+    return (time.perf_counter() - start) * 1000 / repeats
+
+
+if __name__ == "__main__":
+    for n in (20, 50, 100):
+        print(f"rerank {n:3d} candidates -> 5: {benchmark(n_candidates=n):6.2f} ms/query")
@@ -0,0 +1,335 @@
+# retrieval_service.py
+
+"""
+Local retrieval service that owns the FAISS indexes.
+
+The server listens on a Unix socket and pre-forks a pool of query workers.
+Indexes listed with ``--preload`` are loaded once in the parent before the
+fork, so every worker shares the same physical pages (copy-on-write, and the
+FAISS vectors are never written). Indexes opened later are memory-mapped
+read-only, so the kernel page cache is again shared between workers.
+
+Streamlit sessions talk to it through ``RetrievalClient``; when
+``PAPERSAGE_RETRIEVAL_SOCKET`` is unset the app searches in-process as before.
+
+    python retrieval_service.py serve --workers 8 --preload faiss_index_<md5>
+    python retrieval_service.py bench faiss_index_<md5> "What is the method?"
+"""
+
+import os
+import pickle
+import secrets
+import signal
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+import multiprocessing as mp
+
+SOCKET_PATH = os.getenv("PAPERSAGE_RETRIEVAL_SOCKET")
+# Shared secret for the socket. When unset, the server writes a random key to
+# ``<socket>.key`` (mode 0600) and clients on the same account read it from there.
+AUTHKEY = os.getenv("PAPERSAGE_RETRIEVAL_AUTHKEY", "").encode() or None
+EMBEDDING_MODEL = "models/embedding-001"
+# Indexes loaded on demand per worker, on top of the shared preloaded ones
+CACHE_SIZE = int(os.getenv("PAPERSAGE_RETRIEVAL_CACHE_SIZE", "4"))
+# Load tests only: embed queries locally instead of calling the Gemini API
+FAKE_EMBEDDINGS = False
+
+
+def load_index(index_path):
+    """
+    Load a saved LangChain FAISS store, memory-mapping the vectors when the
+    installed faiss build supports it.
+    """
+    import faiss
+    from langchain_community.vectorstores import FAISS
+
+    index_file = os.path.join(index_path, "index.faiss")
+    try:
+        index = faiss.read_index(index_file, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except (AttributeError, RuntimeError):
+        index = faiss.read_index(index_file)
+    with open(os.path.join(index_path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    if FAKE_EMBEDDINGS:
+        from langchain_community.embeddings import DeterministicFakeEmbedding
+        embeddings = DeterministicFakeEmbedding(size=index.d)
+    else:
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        embeddings = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+
+class IndexCache:
+    """
+    Per-process LRU cache of loaded indexes, reloaded when the files on disk
+    change and dropped when they disappear. Pinned (preloaded) entries are
+    loaded before the workers fork, so they are shared and never evicted.
+    """
+
+    def __init__(self, max_size=CACHE_SIZE):
+        self.max_size = max_size
+        self._stores = OrderedDict()
+        self._pinned = set()
+
+    def _version(self, index_path):
+        try:
+            return os.stat(os.path.join(index_path, "index.faiss")).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def __len__(self):
+        return len(self._stores)
+
+    def __contains__(self, index_path):
+        return os.path.abspath(index_path) in self._stores
+
+    def pin(self, index_path):
+        self.get(index_path)
+        self._pinned.add(os.path.abspath(index_path))
+
+    def get(self, index_path):
+        index_path = os.path.abspath(index_path)
+        # Forget indexes deleted or evicted from disk since they were loaded
+        for path in [p for p in self._stores if self._version(p) is None]:
+            del self._stores[path]
+            self._pinned.discard(path)
+        version = self._version(index_path)
+        if version is None:
+            raise RuntimeError(f"No FAISS index at {index_path}")
+        cached = self._stores.get(index_path)
+        if cached and cached[0] == version:
+            self._stores.move_to_end(index_path)
+            return cached[1]
+        store = load_index(index_path)
+        self._stores[index_path] = (version, store)
+        self._stores.move_to_end(index_path)
+        unpinned = [p for p in self._stores if p not in self._pinned]
+        while len(unpinned) > self.max_size:
+            del self._stores[unpinned.pop(0)]
+        return store
+
+
+def handle_request(cache, request):
+    op = request.get("op")
+    if op == "ping":
+        return {"ok": True, "pid": os.getpid()}
+    if op == "search":
+        import rerank
+
+        store = cache.get(request["index"])
+        docs = rerank.retrieve(store, request["query"], k=request.get("k", 5))
+        return {"ok": True, "docs": [(d.page_content, d.metadata) for d in docs]}
+    return {"ok": False, "error": f"Unknown op: {op}"}
+
+
+def key_path(socket_path):
+    return socket_path + ".key"
+
+
+def load_authkey(socket_path):
+    """
+    ``PAPERSAGE_RETRIEVAL_AUTHKEY`` if set, else the key the server wrote next
+    to ``socket_path``. Raises OSError if there is none.
+    """
+    if AUTHKEY:
+        return AUTHKEY
+    with open(key_path(socket_path), "rb") as f:
+        return f.read().strip()
+
+
+def create_authkey(socket_path):
+    """
+    Return ``PAPERSAGE_RETRIEVAL_AUTHKEY``, or write a fresh random key to a
+    file only the current user can read.
+    """
+    if AUTHKEY:
+        return AUTHKEY
+    path = key_path(socket_path)
+    if os.path.exists(path):
+        os.unlink(path)
+    key = secrets.token_hex(32).encode()
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def _worker_loop(listener, cache):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            conn = listener.accept()
+        except (OSError, EOFError, mp.AuthenticationError):
+            # Bad key or client gone mid-handshake; keep serving others
+            continue
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    break
+                try:
+                    reply = handle_request(cache, request)
+                except Exception as e:
+                    reply = {"ok": False, "error": str(e)}
+                try:
+                    conn.send(reply)
+                except OSError:
+                    # Client went away during a slow search, e.g. a Streamlit rerun
+                    break
+
+
+def serve(socket_path=None, workers=None, preload=(), fake_embeddings=False):
+    """
+    Run the service until interrupted, respawning workers that die.
+    """
+    global FAKE_EMBEDDINGS
+    FAKE_EMBEDDINGS = fake_embeddings
+    socket_path = socket_path or SOCKET_PATH or "papersage_retrieval.sock"
+    workers = workers or os.cpu_count() or 1
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    cache = IndexCache()
+    for path in preload:
+        cache.pin(path)
+
+    ctx = mp.get_context("fork")
+    listener = Listener(socket_path, family="AF_UNIX", authkey=create_authkey(socket_path))
+    os.chmod(socket_path, 0o600)
+
+    def spawn():
+        p = ctx.Process(target=_worker_loop, args=(listener, cache), daemon=True)
+        p.start()
+        return p
+
+    procs = [spawn() for _ in range(workers)]
+    print(f"Retrieval service on {socket_path} with {workers} worker(s)")
+    try:
+        while True:
+            time.sleep(1)
+            for i, p in enumerate(procs):
+                if not p.is_alive():
+                    print(f"Worker {p.pid} exited with {p.exitcode}; respawning")
+                    procs[i] = spawn()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in procs:
+            p.terminate()
+        listener.close()
+        for path in (socket_path, key_path(socket_path)):
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+class RetrievalClient:
+    """
+    Thin client used by Streamlit sessions. Opens one connection per call so
+    idle sessions never hold a worker.
+    """
+
+    def __init__(self, socket_path=None, authkey=None):
+        self.socket_path = socket_path or SOCKET_PATH
+        self.authkey = authkey
+
+    def _call(self, request):
+        authkey = self.authkey or load_authkey(self.socket_path)
+        with Client(self.socket_path, family="AF_UNIX", authkey=authkey) as conn:
+            conn.send(request)
+            reply = conn.recv()
+        if not reply.get("ok"):
+            raise RuntimeError(reply.get("error", "retrieval service error"))
+        return reply
+
+    def ping(self):
+        return self._call({"op": "ping"})["pid"]
+
+    def similarity_search(self, index_path, query, k=5):
+        from langchain.docstore.document import Document
+
+        reply = self._call({
+            "op": "search",
+            "index": os.path.abspath(index_path),
+            "query": query,
+            "k": k,
+        })
+        return [Document(page_content=t, metadata=m) for t, m in reply["docs"]]
+
+
+def load_test(index_path, queries, concurrency=(1, 2, 4, 8), rounds=20, socket_path=None):
+    """
+    Fire ``rounds`` batches of ``queries`` at the service for each concurrency
+    level and return ``{concurrency: queries_per_second}``.
+    """
+    client = RetrievalClient(socket_path)
+    client.similarity_search(index_path, queries[0])  # warm the index in a worker
+    results = {}
+    work = list(queries) * rounds
+    for n in concurrency:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            list(pool.map(lambda q: client.similarity_search(index_path, q), work))
+        results[n] = len(work) / (time.perf_counter() - start)
+    return results
+
+
+def make_bench_index(path, n_chunks, dim):
+    """
+    Write a synthetic compacted index of ``n_chunks`` random vectors.
+    """
+    import faiss
+    import numpy as np
+    from langchain_community.embeddings import DeterministicFakeEmbedding
+    from langchain_community.vectorstores import FAISS
+
+    import chunk_table
+
+    rng = np.random.default_rng(0)
+    index = faiss.IndexFlatL2(dim)
+    table = chunk_table.ChunkTable()
+    for start in range(0, n_chunks, 10_000):
+        count = min(10_000, n_chunks - start)
+        index.add(rng.standard_normal((count, dim)).astype(np.float32))
+        for i in range(start, start + count):
+            table.append(f"synthetic chunk {i} about retrieval", {"source": f"paper{i % 50}.pdf", "page": i % 300 + 1})
+    docstore = chunk_table.ChunkDocstore(table)
+    embeddings = DeterministicFakeEmbedding(size=dim)
+    FAISS(embeddings, index, docstore, chunk_table.IdentityIds(docstore)).save_local(path)
+
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="PaperSage retrieval service")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_serve = sub.add_parser("serve")
+    p_serve.add_argument("--socket", default=None)
+    p_serve.add_argument("--workers", type=int, default=None)
+    p_serve.add_argument("--preload", nargs="*", default=[])
+    p_serve.add_argument("--fake-embeddings", action="store_true",
+                         help="embed queries locally (load testing without API calls)")
+    p_index = sub.add_parser("bench-index", help="write a synthetic index for load testing")
+    p_index.add_argument("path")
+    p_index.add_argument("--chunks", type=int, default=100_000)
+    p_index.add_argument("--dim", type=int, default=768)
+    p_bench = sub.add_parser("bench")
+    p_bench.add_argument("index")
+    p_bench.add_argument("queries", nargs="+")
+    p_bench.add_argument("--socket", default=None)
+    p_bench.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.cmd == "serve":
+        serve(args.socket, args.workers, args.preload, args.fake_embeddings)
+    elif args.cmd == "bench-index":
+        make_bench_index(args.path, args.chunks, args.dim)
+    else:
+        base = None
+        for n, qps in load_test(args.index, args.queries, rounds=args.rounds, socket_path=args.socket).items():
+            base = base or qps
+            print(f"{n:3d} client(s): {qps:8.1f} q/s  (x{qps / base:.2f})")
@@ -0,0 +1,287 @@
+# storage.py
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import db_utils
+
+UPLOAD_ROOT = "uploads"
+INDEX_ROOT = "."
+TRASH_DIR = ".trash"
+USER_QUOTA_BYTES = int(float(os.getenv("PAPERSAGE_USER_QUOTA_MB", "500")) * 1024 * 1024)
+SWEEP_INTERVAL = int(os.getenv("PAPERSAGE_SWEEP_INTERVAL", "3600"))
+# Unregistered files younger than this may belong to an in-flight upload or build
+SWEEP_GRACE_SECONDS = 3600
+
+_sweeper = None
+
+
+class StoredFile:
+    """
+    A saved upload that quacks like Streamlit's UploadedFile (``name`` and
+    ``getvalue()``), so stored PDFs can be re-processed without re-uploading.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+
+    def getvalue(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+def default_index_path(notebook_name):
+    return f"faiss_index_{hashlib.md5(notebook_name.encode()).hexdigest()}"
+
+
+def user_dir(user):
+    # Usernames and notebook names are free text, so never use them as paths
+    return os.path.join(UPLOAD_ROOT, hashlib.md5(user.encode()).hexdigest())
+
+
+def _plain_component(name):
+    return name not in ("", ".", "..") and os.path.basename(name) == name and (not os.altsep or os.altsep not in name)
+
+
+def notebook_dir(user, notebook_id):
+    return os.path.join(user_dir(user), str(int(notebook_id)))
+
+
+def path_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for fn in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, fn))
+            except OSError:
+                pass
+    return total
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def save_uploads(user, notebook_id, files):
+    """
+    Write uploaded files under the notebook's folder and register them.
+    They replace the notebook's previous uploads, so a rebuild from stored
+    uploads indexes the same files as the last "Process PDFs".
+    """
+    previous = db_utils.get_artifacts(notebook_id=notebook_id, kind="upload")
+    folder = notebook_dir(user, notebook_id)
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for f in files:
+        name = os.path.basename(f.name)
+        if name in ("", ".", ".."):
+            raise ValueError(f"Invalid file name: {f.name!r}")
+        path = os.path.join(folder, name)
+        data = f.getvalue()
+        with open(path, "wb") as out:
+            out.write(data)
+        db_utils.add_artifact(notebook_id, "upload", path, len(data), time.time())
+        paths.append(path)
+    for a in previous:
+        if a["path"] not in paths:
+            _remove(a["path"])
+            db_utils.delete_artifact(a["path"])
+    return paths
+
+
+def stored_uploads(notebook_id):
+    return [
+        StoredFile(a["path"])
+        for a in db_utils.get_artifacts(notebook_id=notebook_id, kind="upload")
+        if os.path.exists(a["path"])
+    ]
+
+
+def register_index(notebook_id, index_path):
+    db_utils.add_artifact(notebook_id, "index", index_path, path_size(index_path), time.time())
+
+
+def touch(path):
+    db_utils.touch_artifact(path, time.time())
+
+
+def delete_notebook(user, name):
+    """
+    Delete a notebook, its notes and every file it owns.
+
+    Files are first moved into a trash directory; only once the database
+    transaction commits are they removed for good. On failure they are moved
+    back, so the rows and files never disagree.
+    """
+    nb = next((n for n in db_utils.get_notebooks(user) if n["name"] == name), None)
+    if nb is None:
+        return
+    paths = {a["path"] for a in db_utils.get_artifacts(notebook_id=nb["id"])}
+    if nb["faiss_path"]:
+        paths.add(nb["faiss_path"])
+
+    # One fresh directory per call: os.replace keeps each file's old mtime,
+    # so the sweeper judges the batch by this directory's mtime instead.
+    batch = os.path.join(TRASH_DIR, uuid.uuid4().hex)
+    os.makedirs(batch)
+    moved = []
+    conn = db_utils.get_connection()
+    try:
+        for i, path in enumerate(sorted(paths)):
+            if os.path.exists(path):
+                dest = os.path.join(batch, str(i))
+                os.replace(path, dest)
+                moved.append((path, dest))
+        db_utils.delete_notebook(user, name, conn=conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        for path, dest in moved:
+            # The sweeper may have removed the emptied folder meanwhile
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            os.replace(dest, path)
+        _remove(batch)
+        raise
+    finally:
+        conn.close()
+
+    _remove(batch)
+    # Uploads saved before notebook_dir() existed live in uploads/<user>/<name>/
+    folders = {notebook_dir(user, nb["id"])}
+    folders.update(os.path.dirname(p) for p, _ in moved if p.startswith(UPLOAD_ROOT + os.sep))
+    for folder in folders:
+        if os.path.isdir(folder) and not os.listdir(folder):
+            os.rmdir(folder)
+
+
+def sweep_orphans(grace_seconds=SWEEP_GRACE_SECONDS):
+    """
+    Remove index directories and uploads that no notebook owns any more.
+    Unregistered uploads and indexes of a live notebook are adopted rather
+    than deleted.
+    Returns the removed paths.
+    """
+    notebooks = db_utils.get_all_notebooks()
+    by_folder = {os.path.normpath(notebook_dir(n["user"], n["id"])): n for n in notebooks}
+    # Older uploads live in uploads/<user>/<name>/; skip names that are not
+    # plain path components so they cannot claim another user's folder
+    for n in notebooks:
+        if all(_plain_component(x) for x in (n["user"], n["name"])):
+            by_folder.setdefault(os.path.join(UPLOAD_ROOT, n["user"], n["name"]), n)
+    known = {os.path.normpath(a["path"]) for a in db_utils.get_artifacts()}
+    for n in notebooks:
+        path = n["faiss_path"] or default_index_path(n["name"])
+        # Indexes built before artifacts were tracked: adopt them so they count toward quota
+        if n["processed"] and n["faiss_path"] and os.path.normpath(path) not in known and os.path.exists(path):
+            db_utils.add_artifact(n["id"], "index", path, path_size(path), os.path.getmtime(path))
+        known.add(os.path.normpath(path))
+
+    cutoff = time.time() - grace_seconds
+    removed = []
+
+    def stale(path):
+        try:
+            return os.path.getmtime(path) < cutoff
+        except OSError:
+            return False
+
+    for entry in os.scandir(INDEX_ROOT):
+        if entry.is_dir() and entry.name.startswith("faiss_index_"):
+            path = os.path.normpath(entry.path)
+            if path not in known and stale(path):
+                _remove(path)
+                removed.append(path)
+
+    if os.path.isdir(UPLOAD_ROOT):
+        for owner in os.listdir(UPLOAD_ROOT):
+            owner_dir = os.path.join(UPLOAD_ROOT, owner)
+            if not os.path.isdir(owner_dir):
+                continue
+            for name in os.listdir(owner_dir):
+                folder = os.path.join(owner_dir, name)
+                nb = by_folder.get(os.path.normpath(folder))
+                for fn in os.listdir(folder) if os.path.isdir(folder) else []:
+                    path = os.path.normpath(os.path.join(folder, fn))
+                    if path in known:
+                        continue
+                    if nb is not None:
+                        db_utils.add_artifact(nb["id"], "upload", path, path_size(path), os.path.getmtime(path))
+                    elif stale(path):
+                        _remove(path)
+                        removed.append(path)
+                if os.path.isdir(folder) and not os.listdir(folder):
+                    os.rmdir(folder)
+
+    if os.path.isdir(TRASH_DIR):
+        for fn in os.listdir(TRASH_DIR):
+            path = os.path.join(TRASH_DIR, fn)
+            if stale(path):
+                _remove(path)
+    return removed
+
+
+def usage_bytes(user):
+    return sum(a["size_bytes"] for a in db_utils.get_artifacts(user=user))
+
+
+def enforce_quota(user, quota_bytes=None, exclude_notebook_id=None):
+    """
+    Evict the user's least recently used indexes until their artifacts fit
+    in the quota. Only indexes whose uploads are stored (so they can be
+    rebuilt) are evicted, never the index of ``exclude_notebook_id``;
+    uploads themselves are never touched. If evicting every candidate would
+    still leave the user over quota, nothing is evicted.
+    Returns the evicted index paths.
+    """
+    quota_bytes = USER_QUOTA_BYTES if quota_bytes is None else quota_bytes
+    artifacts = db_utils.get_artifacts(user=user)
+    total = sum(a["size_bytes"] for a in artifacts)
+    rebuildable = {a["notebook_id"] for a in artifacts if a["kind"] == "upload"}
+    rebuildable.discard(exclude_notebook_id)
+    candidates = sorted(
+        (a for a in artifacts if a["kind"] == "index" and a["notebook_id"] in rebuildable),
+        key=lambda a: a["last_used"] or 0
+    )
+    if total - sum(a["size_bytes"] for a in candidates) > quota_bytes:
+        return []
+    evicted = []
+    for a in candidates:
+        if total <= quota_bytes:
+            break
+        _remove(a["path"])
+        db_utils.delete_artifact(a["path"])
+        db_utils.update_notebook_processing(a["notebook_id"], False, None)
+        total -= a["size_bytes"]
+        evicted.append(a["path"])
+    return evicted
+
+
+def start_background_sweeper(interval=SWEEP_INTERVAL):
+    """
+    Start the orphan sweep in a daemon thread, once per process.
+    """
+    global _sweeper
+    if _sweeper is not None and _sweeper.is_alive():
+        return _sweeper
+
+    def loop():
+        while True:
+            try:
+                sweep_orphans()
+            except Exception:
+                pass
+            time.sleep(interval)
+
+    _sweeper = threading.Thread(target=loop, name="papersage-sweeper", daemon=True)
+    _sweeper.start()
+    return _sweeper
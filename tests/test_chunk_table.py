@@ -0,0 +1,91 @@
+import pickle
+
+import pytest
+
+import chunk_table
+
+
+class Doc:
+    def __init__(self, page_content, metadata):
+        self.page_content = page_content
+        self.metadata = metadata
+
+
+def make_table():
+    return chunk_table.ChunkTable.from_documents([
+        Doc("first ünïcode chunk", {"source": "a.pdf", "page": 1, "start_index": 0}),
+        Doc("second", {"source": "b.pdf", "page": 4}),
+        Doc("third", {"source": "a.pdf", "page": 2, "section": "Intro"}),
+    ])
+
+
+def test_table_round_trips_text_and_metadata():
+    table = make_table()
+    assert len(table) == 3
+    assert table.sources == ["a.pdf", "b.pdf"]
+    assert table[0].page_content == "first ünïcode chunk"
+    assert table[0].metadata == {"source": "a.pdf", "page": 1, "start_index": 0}
+    assert table[1].metadata == {"source": "b.pdf", "page": 4}
+    assert table[2].metadata == {"source": "a.pdf", "page": 2, "section": "Intro"}
+
+
+def test_table_pickles():
+    table = pickle.loads(pickle.dumps(make_table()))
+    assert table[2].page_content == "third"
+    table.append("fourth", {"source": "a.pdf", "page": 9})
+    assert table.sources == ["a.pdf", "b.pdf"]
+
+
+def test_identity_ids():
+    ids = chunk_table.IdentityIds(chunk_table.ChunkDocstore(make_table()))
+    assert len(ids) == 3
+    assert ids[2] == "2"
+    assert list(ids.items()) == [(0, "0"), (1, "1"), (2, "2")]
+
+
+def make_store():
+    pytest.importorskip("faiss")
+    FAISS = pytest.importorskip("langchain_community.vectorstores").FAISS
+    from langchain_community.embeddings import DeterministicFakeEmbedding
+    from langchain_core.documents import Document
+    docs = [Document(page_content=f"chunk {i}", metadata={"source": "a.pdf", "page": i + 1}) for i in range(3)]
+    return FAISS.from_documents(docs, DeterministicFakeEmbedding(size=8)), Document
+
+
+def test_compacted_store_is_read_only():
+    store, Document = make_store()
+    chunk_table.compact_store(store)
+    assert store.similarity_search("chunk 1", k=1)[0].page_content == "chunk 1"
+    with pytest.raises(ValueError):
+        store.add_documents([Document(page_content="new", metadata={"source": "b.pdf", "page": 1})])
+    assert len(store.docstore) == store.index.ntotal == 3
+
+
+def test_expand_store_allows_appending():
+    store, Document = make_store()
+    other, _ = make_store()
+    chunk_table.compact_store(store)
+    chunk_table.expand_store(store)
+    store.add_documents([Document(page_content="new", metadata={"source": "b.pdf", "page": 1})])
+    store.merge_from(other)
+    chunk_table.compact_store(store)
+
+    assert store.index.ntotal == len(store.docstore) == 7
+    assert store.similarity_search("new", k=1)[0].metadata == {"source": "b.pdf", "page": 1}
+    assert [store.docstore.search(str(i)).page_content for i in (3, 6)] == ["new", "chunk 2"]
+
+
+def test_page_ranges():
+    assert chunk_table.page_ranges([7, 3, 4, 5, 9, 4]) == "3–5, 7, 9"
+    assert chunk_table.page_ranges([2]) == "2"
+
+
+def test_format_citations_groups_by_source():
+    docs = [
+        Doc("", {"source": "b.pdf", "page": 3}),
+        Doc("", {"source": "a.pdf", "page": 5}),
+        Doc("", {"source": "a.pdf", "page": 4}),
+    ]
+    assert chunk_table.format_citations(docs) == (
+        "[Source: a.pdf, Pages: 4–5] [Source: b.pdf, Page: 3]"
+    )
@@ -0,0 +1,125 @@
+import pytest
+
+import chunking
+
+
+def words(n, start=0):
+    return " ".join(f"word{i}" for i in range(start, start + n)) + "."
+
+
+def test_is_heading():
+    assert chunking.is_heading("1. INTRODUCTION")
+    assert chunking.is_heading("2.3 Selective Inference")
+    assert chunking.is_heading("References")
+    assert chunking.is_heading("RELATED WORK")
+    assert not chunking.is_heading("MRI")
+    assert not chunking.is_heading("This is an ordinary sentence in the text.")
+    assert not chunking.is_heading("2. The encoder consists of 3 blocks, where each block")
+    assert not chunking.is_heading("2. Take the difference between ground truth and")
+    assert not chunking.is_heading("3. Binarize the error", "a pixel Xi =1 if abs(Xi)>threshold")
+
+
+# Page 3 of uploads/zubair123/Zubair/2410.13363v1.pdf as extracted by PyMuPDF
+SAMPLE_PAGE = (
+    "estimation. \n2.2.2 Model architecture \nTo reduce computational time of selective inference \n"
+    "testing, we construct a relatively simple CVAE as in Fig. \n2. The encoder consists of 3 blocks, where each block \n"
+    "contains one convolutional and one max pooling layer; \nthe decoder consists of 3 blocks, one convolutional and \n"
+    "one up-sampling layer with skip connections. \n2.2.3 Model training \nFollowing a common training and inference scheme \n"
+    "of anomaly detection, we train on healthy subjects only. \n2.2.4 Anomaly detection pipeline \n"
+    "After the model is trained with only healthy subjects, \nwe describe the steps for anomaly detection as follows: \n"
+    "1. Given the image of an Alzheimer’s subject, the \nCVAE predicts the “healthy” alternative image \n"
+    "2. Take the difference between ground truth and \nprediction to find reconstruction error per pixel \n"
+    "3. Binarize the error by applying a threshold where \na pixel Xi =1 if abs(Xi)>threshold and 0 otherwise \n"
+    "4. Obtain the anomaly mask \nFor the threshold, we take the 95th percentile of the \n"
+    "reconstruction error for the healthy test set. \n2.3 Selective Inference \n2.3.1 Statistical test \n"
+    "Here we follow the same set-up to assess our CVAE \n"
+)
+
+
+def test_headings_on_real_extracted_page():
+    text = "1. INTRODUCTION\nIntro.\n2. METHODS\n" + SAMPLE_PAGE
+    assert [h for h, _, _ in chunking._sections(text)] == [
+        "1. INTRODUCTION", "2. METHODS", "2.2.2 Model architecture", "2.2.3 Model training",
+        "2.2.4 Anomaly detection pipeline", "2.3 Selective Inference", "2.3.1 Statistical test",
+    ]
+
+
+def test_padded_heading_lines_are_split():
+    # PyMuPDF with sort=True merges a line of the other column onto the heading
+    page = "2. METHODS                                  memory  complaint,  early mild  cognitive impairment,\n" + words(20)
+    text, _ = chunking._merge_pages([(1, page)])
+    assert [h for h, _, _ in chunking._sections(text)] == ["2. METHODS"]
+
+
+def test_sections_merge_across_pages_with_provenance():
+    pages = [
+        (1, "1. Introduction\n" + words(60)),
+        (2, words(60, 60) + "\n2. Method\n" + words(60, 200)),
+    ]
+    chunks = chunking.chunk_pages("a.pdf", pages, max_tokens=500, min_tokens=10)
+    assert [m["section"] for _, m in chunks] == ["1. Introduction", "2. Method"]
+    intro, method = chunks
+    assert (intro[1]["page"], intro[1]["page_end"]) == (1, 2)
+    assert "word0" in intro[0] and "word119" in intro[0]
+    assert (method[1]["page"], method[1]["page_end"]) == (2, 2)
+
+
+def test_chunks_respect_token_budget():
+    text = "\n\n".join(words(40, i * 40) for i in range(30))
+    chunks = chunking.chunk_pages("a.pdf", [(1, text)], max_tokens=200)
+    assert len(chunks) > 1
+    assert all(chunking.count_tokens(t) <= 200 for t, _ in chunks)
+    joined = " ".join(t for t, _ in chunks)
+    assert "word0" in joined and "word1199" in joined
+
+
+def test_short_sections_are_merged():
+    pages = [(1, "ABSTRACT\nShort abstract.\n1. Introduction\n" + words(30))]
+    chunks = chunking.chunk_pages("a.pdf", pages, max_tokens=500, min_tokens=50)
+    assert len(chunks) == 1
+
+
+def test_short_section_leads_into_following_chunk():
+    refs = " ".join(words(20, i * 20) for i in range(15))
+    pages = [(1, "Acknowledgements\nThanks to all.\nReferences\n" + refs)]
+    chunks = chunking.chunk_pages("a.pdf", pages, max_tokens=200, min_tokens=50, overlap_tokens=0)
+    assert chunks[0][0].startswith("Acknowledgements\nThanks to all.\nReferences")
+    assert chunks[0][1]["section"] == "References"
+    assert all(chunking.count_tokens(t) >= 50 for t, _ in chunks[:-1])
+
+
+def test_running_headers_and_inline_headings():
+    pages = [
+        (i, f"Journal of Things {i}\n{words(20, i * 100)} 2. METHODS We do things.\n{words(5, i * 10)}")
+        for i in range(1, 5)
+    ]
+    chunks = chunking.chunk_pages("a.pdf", pages, max_tokens=500, min_tokens=0)
+    text = " ".join(t for t, _ in chunks)
+    assert "Journal of Things" not in text
+    assert any(m.get("section") == "2. METHODS" for _, m in chunks)
+
+
+def make_documents(n_sources=3):
+    Document = pytest.importorskip("langchain.docstore.document").Document
+    return [
+        Document(page_content=f"1. Introduction\n{words(200, s * 1000)}", metadata={"source": f"p{s}.pdf", "page": 1})
+        for s in range(n_sources)
+    ]
+
+
+def test_small_batches_are_chunked_in_process(monkeypatch):
+    monkeypatch.setattr(chunking, "_get_pool", lambda: pytest.fail("pool should not be used"))
+    docs = chunking.chunk_documents(make_documents())
+    assert [d.metadata["source"] for d in docs] == ["p0.pdf", "p1.pdf", "p2.pdf"]
+
+
+def test_large_batches_use_shared_pool(monkeypatch):
+    monkeypatch.setattr(chunking.os, "cpu_count", lambda: 4)
+    documents = make_documents()
+    serial = chunking.chunk_documents(documents)
+    parallel = chunking.chunk_documents(documents, parallel_min_chars=0)
+    assert [(d.page_content, d.metadata) for d in parallel] == [(d.page_content, d.metadata) for d in serial]
+    pool = chunking._get_pool()
+    assert pool._mp_context.get_start_method() in ("forkserver", "spawn")
+    chunking.chunk_documents(documents, parallel_min_chars=0)
+    assert chunking._get_pool() is pool
@@ -30,6 +30,7 @@ def test_init_db_creates_tables(use_temp_db):
     tables = {row[0] for row in cur.fetchall()}
     assert 'notebooks' in tables
     assert 'notes' in tables
+    assert 'artifacts' in tables
     conn.close()
 
 
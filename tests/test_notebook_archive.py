@@ -0,0 +1,115 @@
+import os
+import struct
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import db_utils
+import notebook_archive
+
+
+class FakeIndex:
+    metric_type = 1
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.ntotal, self.d = vectors.shape
+
+    def reconstruct_n(self, start, count):
+        return self.vectors[start:start + count]
+
+
+class FakeDoc:
+    def __init__(self, text, metadata):
+        self.page_content = text
+        self.metadata = metadata
+
+
+class FakeDocstore:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def search(self, key):
+        return self.docs[key]
+
+
+class FakeStore:
+    distance_strategy = "EUCLIDEAN_DISTANCE"
+    _normalize_L2 = False
+
+    def __init__(self, vectors, docs):
+        self.index = FakeIndex(vectors)
+        self.docstore = FakeDocstore({f"id{i}": d for i, d in enumerate(docs)})
+        self.index_to_docstore_id = {i: f"id{i}" for i in range(len(docs))}
+
+
+def make_store(n=5, dim=8):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    docs = [FakeDoc(f"chunk {i} – ünïcode", {"source": "a.pdf", "page": i + 1}) for i in range(n)]
+    return FakeStore(vectors, docs)
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_round_trip(tmp_path, dtype):
+    store = make_store()
+    path = str(tmp_path / "nb.psnb")
+    notebook_archive.export_notebook(store, ["a note"], path, "NB", dtype)
+
+    archive = notebook_archive.NotebookArchive(path)
+    assert archive.name == "NB"
+    assert archive.notes == ["a note"]
+    assert len(archive) == 5
+    assert isinstance(archive.vectors, np.memmap)
+    assert archive.vectors.dtype == np.dtype(dtype)
+    np.testing.assert_allclose(archive.vectors, store.index.vectors, rtol=1e-3, atol=1e-3)
+    assert [archive.text(i) for i in range(5)] == [store.docstore.search(f"id{i}").page_content for i in range(5)]
+    assert archive.metadata()[2] == {"source": "a.pdf", "page": 3}
+    assert archive.config["metric_type"] == 1
+
+
+def test_rejects_foreign_file(tmp_path):
+    path = tmp_path / "bad.psnb"
+    path.write_bytes(b"not an archive at all")
+    with pytest.raises(ValueError):
+        notebook_archive.NotebookArchive(str(path))
+
+
+def test_rejects_short_file(tmp_path):
+    path = tmp_path / "short.psnb"
+    path.write_bytes(notebook_archive.MAGIC + b"\0\0")
+    with pytest.raises(ValueError):
+        notebook_archive.NotebookArchive(str(path))
+
+
+@pytest.mark.parametrize("footer", [b"{}", b"[1, 2]", b"not json", b'{"version": 1, "name": "x"}'])
+def test_rejects_malformed_footer(tmp_path, footer):
+    path = tmp_path / "bad.psnb"
+    magic = notebook_archive.MAGIC
+    path.write_bytes(magic + footer + struct.pack("<Q", len(footer)) + magic)
+    with pytest.raises(ValueError):
+        notebook_archive.NotebookArchive(str(path))
+
+
+def test_failed_import_leaves_nothing_behind(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(db_utils, 'DB_PATH', str(tmp_path / "test_papersage.db"))
+    db_utils.init_db()
+    path = str(tmp_path / "nb.psnb")
+    notebook_archive.export_notebook(make_store(), ["a note"], path, "NB")
+
+    class SavedStore:
+        def save_local(self, index_path):
+            os.makedirs(index_path)
+
+    def boom(*args, **kwargs):
+        raise RuntimeError("db down")
+    monkeypatch.setattr(notebook_archive, 'build_store', lambda archive: SavedStore())
+    monkeypatch.setattr(db_utils, 'add_note_to_db', boom)
+
+    with pytest.raises(RuntimeError):
+        notebook_archive.import_notebook(path, 'alice')
+    assert db_utils.get_notebooks('alice') == []
+    assert db_utils.get_artifacts() == []
+    assert not os.path.exists(notebook_archive.storage.default_index_path("NB"))
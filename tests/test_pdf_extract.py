@@ -0,0 +1,116 @@
+import os
+
+import pytest
+
+import pdf_extract
+
+
+class FakeBackend:
+
+    def __init__(self, name, pages, fail=False):
+        self.name = name
+        self._pages = pages
+        self.fail = fail
+        self.calls = 0
+
+    def pages(self, data):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("cannot open")
+        return list(self._pages)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return pdf_extract.PageCache(str(tmp_path / "cache.db"))
+
+
+def test_extract_pages_parses_once(cache):
+    backend = FakeBackend("primary", ["page one", "page two"])
+    first = pdf_extract.extract_pages(b"pdf-a", backend, cache, backends=[])
+    second = pdf_extract.extract_pages(b"pdf-a", backend, cache, backends=[])
+    assert first == second == ["page one", "page two"]
+    assert backend.calls == 1
+
+
+def test_cache_keyed_by_content(cache):
+    backend = FakeBackend("primary", ["page one"])
+    pdf_extract.extract_pages(b"pdf-a", backend, cache, backends=[])
+    pdf_extract.extract_pages(b"pdf-b", backend, cache, backends=[])
+    assert backend.calls == 2
+
+
+def test_falls_back_per_page(cache):
+    primary = FakeBackend("primary", ["good", None, ""])
+    fallback = FakeBackend("fallback", ["other", "rescued", "  "])
+    pages = pdf_extract.extract_pages(b"pdf", primary, cache, backends=[fallback])
+    assert pages == ["good", "rescued", ""]
+
+
+def test_falls_back_when_primary_cannot_open(cache):
+    primary = FakeBackend("primary", [], fail=True)
+    fallback = FakeBackend("fallback", ["text"])
+    assert pdf_extract.extract_pages(b"pdf", primary, cache, backends=[fallback]) == ["text"]
+
+
+def test_failed_pages_are_not_cached(cache):
+    primary = FakeBackend("primary", ["good", ""])
+    pdf_extract.extract_pages(b"pdf", primary, cache, backends=[])
+    page_count, cached = cache.get(pdf_extract.cache_key(b"pdf"))
+    assert page_count == 2
+    assert cached == {1: "good"}
+
+    # A later run retries only the missing page
+    better = FakeBackend("better", ["ignored", "now readable"])
+    assert pdf_extract.extract_pages(b"pdf", better, cache, backends=[]) == ["good", "now readable"]
+
+
+def test_blank_pages_are_not_parsed_again(cache):
+    primary = FakeBackend("primary", ["text", ""])
+    fallback = FakeBackend("fallback", ["text", None])
+    for _ in range(3):
+        pages = pdf_extract.extract_pages(b"pdf", primary, cache, backends=[fallback])
+        assert pages == ["text", ""]
+    assert primary.calls == fallback.calls == 1
+    assert cache.tried(pdf_extract.cache_key(b"pdf")) == {2: {"primary", "fallback"}}
+
+
+def test_unreadable_pdf_raises(cache):
+    with pytest.raises(ValueError):
+        pdf_extract.extract_pages(b"pdf", FakeBackend("x", [], fail=True), cache, backends=[])
+
+
+def test_get_backend_unknown_name():
+    with pytest.raises(RuntimeError):
+        pdf_extract.get_backend("does-not-exist")
+
+
+def test_cache_is_invalidated_by_extractor_version(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.db")
+    backend = FakeBackend("primary", ["text"])
+    pdf_extract.extract_pages(b"pdf", backend, pdf_extract.PageCache(path), backends=[])
+    monkeypatch.setattr(pdf_extract, "EXTRACT_VERSION", pdf_extract.EXTRACT_VERSION + 1)
+    pdf_extract.extract_pages(b"pdf", backend, pdf_extract.PageCache(path), backends=[])
+    assert backend.calls == 2
+
+
+def test_reading_order_agreement():
+    reference = "the left column continues here and the right column starts there"
+    assert pdf_extract.reading_order_agreement(reference, reference) == 1.0
+    interleaved = "the left column the right column continues here starts there and"
+    assert pdf_extract.reading_order_agreement(interleaved, reference) == pytest.approx(0.7)
+
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), "..", "uploads", "zubair123", "Zubair", "2410.13363v1.pdf")
+
+
+@pytest.mark.skipif(not os.path.exists(SAMPLE_PDF), reason="sample paper not available")
+def test_pymupdf_reads_two_columns_in_order():
+    try:
+        backend = pdf_extract.PyMuPDFBackend()
+    except ImportError:
+        pytest.skip("PyMuPDF not installed")
+    with open(SAMPLE_PDF, "rb") as f:
+        page = backend.pages(f.read())[1]
+    flat = " ".join(page.split())
+    assert "follows the assumption that a hypothesis is predetermined" in flat
@@ -0,0 +1,45 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import rerank
+
+
+def test_query_terms_drops_stopwords():
+    assert rerank.query_terms("What is the attention layer?") == ["attention", "layer"]
+
+
+def test_term_overlap_matches_whole_words():
+    scores = rerank.term_overlap(["ai", "model"], ["Try again later", "An AI model.", "models"])
+    assert scores[0] == 0
+    assert scores[2] == 0
+    assert scores[1] == pytest.approx(1.0)
+    # A near-miss before the whole-word hit does not hide it
+    assert rerank.term_overlap(["loss"], ["glosses, then loss_fn and loss."])[0] == pytest.approx(1.0)
+    assert rerank.term_overlap(["loss"], ["glosses and loss_fn"])[0] == 0
+
+
+def test_rerank_prefers_relevant_and_diverse():
+    q = np.array([1.0, 0.0, 0.0])
+    cands = np.array([
+        [1.0, 0.0, 0.0],   # relevant
+        [0.99, 0.01, 0.0], # near-duplicate of 0
+        [0.7, 0.7, 0.0],   # relevant, different
+        [0.0, 0.0, 1.0],   # irrelevant
+    ])
+    texts = ["attention", "attention", "attention layer", "unrelated"]
+    order = rerank.rerank(q, cands, texts, "attention layer", k=2, mmr_lambda=0.5)
+    assert order[0] == 0
+    assert order[1] == 2
+
+
+def test_cross_encoder_hook_is_used():
+    q = np.array([1.0, 0.0])
+    cands = np.array([[1.0, 0.0], [0.9, 0.1]])
+    order = rerank.rerank(q, cands, ["a", "b"], "q", k=1, mmr_lambda=1.0,
+                          cross_encoder=lambda query, texts: np.array([0.0, 10.0]))
+    assert order == [1]
+
+
+def test_rerank_empty():
+    assert rerank.rerank(np.zeros(3), np.zeros((0, 3)), [], "q") == []
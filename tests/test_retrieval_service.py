@@ -0,0 +1,102 @@
+import multiprocessing as mp
+import os
+import time
+from multiprocessing.connection import Client, Listener
+
+import pytest
+
+import retrieval_service
+
+
+def start_workers(sock, n):
+    listener = Listener(sock, family="AF_UNIX", authkey=retrieval_service.create_authkey(sock))
+    ctx = mp.get_context("fork")
+    procs = [
+        ctx.Process(target=retrieval_service._worker_loop,
+                    args=(listener, retrieval_service.IndexCache()), daemon=True)
+        for _ in range(n)
+    ]
+    for p in procs:
+        p.start()
+    return listener, procs
+
+
+@pytest.fixture
+def service(tmp_path):
+    sock = str(tmp_path / "retrieval.sock")
+    listener, procs = start_workers(sock, 2)
+    yield sock
+    for p in procs:
+        p.terminate()
+    listener.close()
+
+
+def test_generated_authkey_is_private(service):
+    path = retrieval_service.key_path(service)
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    assert len(retrieval_service.load_authkey(service)) == 64
+
+
+def test_client_disconnect_during_search_does_not_kill_worker(tmp_path, monkeypatch):
+    def slow(cache, request):
+        if request["op"] == "slow":
+            time.sleep(0.3)
+        return {"ok": True, "pid": os.getpid(), "data": "x" * 1_000_000}
+    monkeypatch.setattr(retrieval_service, "handle_request", slow)
+    sock = str(tmp_path / "retrieval.sock")
+    listener, procs = start_workers(sock, 1)
+    try:
+        conn = Client(sock, family="AF_UNIX", authkey=retrieval_service.load_authkey(sock))
+        conn.send({"op": "slow"})
+        conn.close()
+        time.sleep(0.5)
+        assert procs[0].is_alive()
+        assert retrieval_service.RetrievalClient(sock).ping() == procs[0].pid
+    finally:
+        procs[0].terminate()
+        listener.close()
+
+
+def test_ping_is_served_by_worker_pool(service):
+    client = retrieval_service.RetrievalClient(service)
+    pids = {client.ping() for _ in range(10)}
+    assert pids and all(isinstance(pid, int) for pid in pids)
+
+
+def test_errors_are_raised_on_client(service):
+    client = retrieval_service.RetrievalClient(service)
+    with pytest.raises(RuntimeError, match="Unknown op"):
+        client._call({"op": "bogus"})
+
+
+def test_bad_authkey_does_not_kill_workers(service):
+    for _ in range(4):
+        with pytest.raises(mp.AuthenticationError):
+            retrieval_service.RetrievalClient(service, authkey=b"wrong").ping()
+    assert retrieval_service.RetrievalClient(service).ping()
+
+
+def make_index(path):
+    path.mkdir()
+    (path / "index.faiss").write_bytes(b"")
+    return str(path)
+
+
+def test_index_cache_is_lru_bounded_and_drops_deleted(tmp_path, monkeypatch):
+    monkeypatch.setattr(retrieval_service, "load_index", lambda path: object())
+    cache = retrieval_service.IndexCache(max_size=2)
+    pinned = make_index(tmp_path / "pinned")
+    a, b, c = (make_index(tmp_path / name) for name in "abc")
+    cache.pin(pinned)
+    cache.get(a)
+    cache.get(b)
+    cache.get(a)
+    cache.get(c)
+    assert pinned in cache and a in cache and c in cache
+    assert b not in cache
+
+    (tmp_path / "a" / "index.faiss").unlink()
+    with pytest.raises(RuntimeError, match="No FAISS index"):
+        cache.get(a)
+    assert a not in cache
+    assert len(cache) == 2
@@ -0,0 +1,223 @@
+import os
+import time
+
+import pytest
+
+import db_utils
+import storage
+
+
+class FakeUpload:
+    def __init__(self, name, data):
+        self.name = name
+        self._data = data
+
+    def getvalue(self):
+        return self._data
+
+
+@pytest.fixture(autouse=True)
+def workdir(monkeypatch, tmp_path):
+    """
+    Run each test in an empty directory with its own database.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(db_utils, 'DB_PATH', str(tmp_path / "test_papersage.db"))
+    db_utils.init_db()
+    return tmp_path
+
+
+def make_index(path, size=100):
+    os.makedirs(path)
+    with open(os.path.join(path, "index.faiss"), "wb") as f:
+        f.write(b"x" * size)
+
+
+def create(user, name):
+    db_utils.create_notebook(user, name)
+    return next(n for n in db_utils.get_notebooks(user) if n['name'] == name)
+
+
+def test_delete_notebook_removes_rows_and_files():
+    nb = create('alice', 'NB')
+    storage.save_uploads('alice', nb['id'], [FakeUpload("a.pdf", b"pdf")])
+    idx = storage.default_index_path('NB')
+    make_index(idx)
+    db_utils.update_notebook_processing(nb['id'], True, idx)
+    storage.register_index(nb['id'], idx)
+    db_utils.add_note_to_db(nb['id'], 'note')
+
+    storage.delete_notebook('alice', 'NB')
+
+    assert db_utils.get_notebooks('alice') == []
+    assert db_utils.get_artifacts() == []
+    assert db_utils.get_notes_from_db(nb['id']) == []
+    assert not os.path.exists(idx)
+    assert not os.path.exists(storage.notebook_dir('alice', nb['id']))
+    assert os.listdir(storage.TRASH_DIR) == []
+
+
+def test_delete_notebook_restores_files_on_failure(monkeypatch):
+    nb = create('alice', 'NB')
+    paths = storage.save_uploads('alice', nb['id'], [FakeUpload("a.pdf", b"pdf")])
+
+    def boom(*args, **kwargs):
+        raise RuntimeError("db down")
+    monkeypatch.setattr(db_utils, 'delete_notebook', boom)
+
+    with pytest.raises(RuntimeError):
+        storage.delete_notebook('alice', 'NB')
+    assert os.path.exists(paths[0])
+    assert len(db_utils.get_notebooks('alice')) == 1
+
+
+def test_save_uploads_replaces_previous_set():
+    nb = create('alice', 'NB')
+    first = storage.save_uploads('alice', nb['id'], [FakeUpload("a.pdf", b"a"), FakeUpload("b.pdf", b"b")])
+    second = storage.save_uploads('alice', nb['id'], [FakeUpload("b.pdf", b"bb"), FakeUpload("c.pdf", b"c")])
+
+    assert sorted(f.name for f in storage.stored_uploads(nb['id'])) == ["b.pdf", "c.pdf"]
+    assert not os.path.exists(first[0])
+    assert storage.usage_bytes('alice') == 3
+    assert all(os.path.exists(p) for p in second)
+
+
+def test_sweep_removes_only_orphans():
+    nb = create('bob', 'Kept')
+    make_index(storage.default_index_path('Kept'))
+    make_index('faiss_index_orphan')
+    kept = storage.notebook_dir('bob', nb['id'])
+    gone = storage.notebook_dir('bob', nb['id'] + 1)
+    for folder in (kept, gone):
+        os.makedirs(folder)
+        with open(os.path.join(folder, 'x.pdf'), 'wb') as f:
+            f.write(b"pdf")
+
+    removed = storage.sweep_orphans(grace_seconds=0)
+
+    assert os.path.normpath('faiss_index_orphan') in removed
+    assert os.path.exists(storage.default_index_path('Kept'))
+    assert not os.path.exists(gone)
+    # Unregistered upload of a live notebook is adopted, not deleted
+    assert [a['path'] for a in db_utils.get_artifacts(notebook_id=nb['id'])] == [
+        os.path.join(kept, 'x.pdf')
+    ]
+
+
+def test_sweep_adopts_unregistered_indexes():
+    nb = create('bob', 'Processed before artifacts')
+    idx = storage.default_index_path(nb['name'])
+    make_index(idx, size=700)
+    db_utils.update_notebook_processing(nb['id'], True, idx)
+    assert storage.usage_bytes('bob') == 0
+
+    storage.sweep_orphans(grace_seconds=0)
+
+    assert [a['kind'] for a in db_utils.get_artifacts(notebook_id=nb['id'])] == ['index']
+    assert storage.usage_bytes('bob') == 700
+    storage.sweep_orphans(grace_seconds=0)
+    assert len(db_utils.get_artifacts()) == 1
+
+
+def test_sweep_adopts_legacy_upload_folders():
+    nb = create('bob', 'Old layout')
+    legacy = os.path.join('uploads', 'bob', 'Old layout')
+    os.makedirs(legacy)
+    with open(os.path.join(legacy, 'x.pdf'), 'wb') as f:
+        f.write(b"pdf")
+
+    assert storage.sweep_orphans(grace_seconds=0) == []
+    assert [a['path'] for a in db_utils.get_artifacts(notebook_id=nb['id'])] == [os.path.join(legacy, 'x.pdf')]
+
+    storage.delete_notebook('bob', 'Old layout')
+    assert not os.path.exists(legacy)
+
+
+def test_sweep_legacy_lookup_ignores_path_like_names():
+    create('mallory', '../bob/Gone')
+    gone = os.path.join('uploads', 'bob', 'Gone')
+    os.makedirs(gone)
+    with open(os.path.join(gone, 'x.pdf'), 'wb') as f:
+        f.write(b"pdf")
+
+    storage.sweep_orphans(grace_seconds=0)
+    assert db_utils.get_artifacts() == []
+    assert not os.path.exists(gone)
+
+
+def test_notebook_names_are_not_paths():
+    nb = create('dave', '../../x')
+    other = create('dave', 'a/b')
+    paths = storage.save_uploads('dave', nb['id'], [FakeUpload("../a.pdf", b"pdf")])
+    storage.save_uploads('dave', other['id'], [FakeUpload("b.pdf", b"pdf")])
+
+    assert paths == [os.path.join(storage.notebook_dir('dave', nb['id']), 'a.pdf')]
+    assert os.path.realpath(paths[0]).startswith(os.path.realpath(storage.UPLOAD_ROOT) + os.sep)
+    storage.sweep_orphans(grace_seconds=0)
+    assert len(storage.stored_uploads(nb['id'])) == len(storage.stored_uploads(other['id'])) == 1
+
+
+def test_sweep_keeps_trash_of_inflight_delete(monkeypatch):
+    nb = create('erin', 'NB')
+    paths = storage.save_uploads('erin', nb['id'], [FakeUpload("a.pdf", b"pdf")])
+    old = time.time() - 10 * storage.SWEEP_GRACE_SECONDS
+    os.utime(paths[0], (old, old))
+
+    def sweep_then_fail(*args, **kwargs):
+        storage.sweep_orphans()
+        raise RuntimeError("db down")
+    monkeypatch.setattr(db_utils, 'delete_notebook', sweep_then_fail)
+
+    with pytest.raises(RuntimeError):
+        storage.delete_notebook('erin', 'NB')
+    assert os.path.exists(paths[0])
+
+
+def test_enforce_quota_evicts_lru_rebuildable_index():
+    old = create('carol', 'Old')
+    new = create('carol', 'New')
+    for nb in (old, new):
+        storage.save_uploads('carol', nb['id'], [FakeUpload("a.pdf", b"p")])
+        idx = storage.default_index_path(nb['name'])
+        make_index(idx, size=1000)
+        db_utils.update_notebook_processing(nb['id'], True, idx)
+        storage.register_index(nb['id'], idx)
+    db_utils.touch_artifact(storage.default_index_path('Old'), time.time() - 100)
+
+    evicted = storage.enforce_quota('carol', quota_bytes=1500)
+
+    assert evicted == [storage.default_index_path('Old')]
+    assert os.path.exists(storage.default_index_path('New'))
+    recs = {n['name']: n for n in db_utils.get_notebooks('carol')}
+    assert recs['Old']['processed'] == 0
+    assert recs['New']['processed'] == 1
+
+
+def make_notebook_with_index(user, name, size):
+    nb = create(user, name)
+    storage.save_uploads(user, nb['id'], [FakeUpload("a.pdf", b"p")])
+    idx = storage.default_index_path(name)
+    make_index(idx, size=size)
+    db_utils.update_notebook_processing(nb['id'], True, idx)
+    storage.register_index(nb['id'], idx)
+    return nb
+
+
+def test_enforce_quota_spares_excluded_notebook():
+    old = make_notebook_with_index('frank', 'Old', 1000)
+    current = make_notebook_with_index('frank', 'Current', 1000)
+    db_utils.touch_artifact(storage.default_index_path('Current'), time.time() - 100)
+
+    evicted = storage.enforce_quota('frank', quota_bytes=1500, exclude_notebook_id=current['id'])
+
+    assert evicted == [storage.default_index_path('Old')]
+    assert os.path.exists(storage.default_index_path('Current'))
+
+
+def test_enforce_quota_evicts_nothing_when_it_cannot_help():
+    make_notebook_with_index('gina', 'Small', 100)
+    current = make_notebook_with_index('gina', 'Huge', 5000)
+
+    assert storage.enforce_quota('gina', quota_bytes=1000, exclude_notebook_id=current['id']) == []
+    assert os.path.exists(storage.default_index_path('Small'))
+    assert storage.usage_bytes('gina') > 1000